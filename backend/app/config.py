@@ -12,6 +12,28 @@ RULES_DIR.mkdir(parents=True, exist_ok=True)
 MODELS_DIR.mkdir(parents=True, exist_ok=True)
 DATASETS_DIR.mkdir(parents=True, exist_ok=True)
 
+# CPU 推断的 torch 线程数（未设置时沿用 PyTorch 默认）；多路 CPU 上可配合
+# OMP_NUM_THREADS / KMP_AFFINITY 或 `ipexrun --ninstances 1 --ncores_per_instance N` 把线程固定在一个 socket 上
+TORCH_THREADS = int(os.environ["AGG_TORCH_THREADS"]) if os.environ.get("AGG_TORCH_THREADS") else None
+# URLTran 单次前向的最大 URL 数；更大的批次按长度排序后分块推断
+URLTRAN_MAX_BATCH = int(os.environ.get("AGG_URLTRAN_MAX_BATCH", "64"))
+# URLTran 推断精度：float32（默认）/ auto（CUDA 用 float16，CPU 用 bfloat16）/ float16 / bfloat16
+URLTRAN_DTYPE = os.environ.get("AGG_URLTRAN_DTYPE", "float32")
+# 是否用 torch.compile 编译 URLTran 前向（首次推断需要额外编译时间，默认关闭）
+URLTRAN_COMPILE = os.environ.get("AGG_URLTRAN_COMPILE", "0") == "1"
+# CPU 上对 URLTran 的 Linear 层做 int8 动态量化（torch 后端；需 float32 权重）
+URLTRAN_QUANTIZE = os.environ.get("AGG_URLTRAN_QUANTIZE", "0") == "1"
+# CPU 上用 intel_extension_for_pytorch 优化 URLTran（需安装 ipex；精度随 URLTRAN_DTYPE）
+URLTRAN_IPEX = os.environ.get("AGG_URLTRAN_IPEX", "0") == "1"
+# URLTran 级联：启发式分数已很确定（≥0.9，或 ≤0.05 且 URL 较短）时直接采用，不再跑 BERT（默认关闭）
+URLTRAN_CASCADE = os.environ.get("AGG_URLTRAN_CASCADE", "0") == "1"
+# URLTran 推断后端：torch（默认）/ onnx（仅 CPU：导出 ONNX 并做 int8 动态量化，由 onnxruntime 推断）
+#                   / torchscript（trace + freeze，输入固定补齐到 128）
+URLTRAN_BACKEND = os.environ.get("AGG_URLTRAN_BACKEND", "torch")
+# 应用导入时预先加载的模型（逗号分隔，如 "urltran"）；配合 gunicorn --preload，fork 出的 worker 共享权重内存页。
+# 仅对 CPU 推断有效：检测到 CUDA 设备时忽略（CUDA 上下文不能跨 fork 使用），各 worker 仍按需加载
+PRELOAD_MODELS = [m.strip() for m in os.environ.get("AGG_PRELOAD_MODELS", "").split(",") if m.strip()]
+
 # 规则与模型源清单（用于前端展示、脚本和后端统一引用）
 RULE_SOURCES = {
     "metamask_eth_phishing_detect": {
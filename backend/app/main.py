@@ -1,26 +1,88 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, Response, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
+from email.utils import parsedate_to_datetime
+import atexit, logging, logging.handlers, os, queue
 
 from .routers.sources import router as sources_router
 from .routers.scan import router as scan_router
 from .routers.evaluate import router as eval_router
 from .routers.datasets import router as datasets_router
+from .services.model_registry import get_registry
+from .config import PRELOAD_MODELS
+
+# 应用日志经队列交给后台线程输出，推断路径上的日志调用不阻塞在终端 I/O 上
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+_app_logger = logging.getLogger(__package__)
+_app_logger.addHandler(_log_handler)
+_app_logger.setLevel(logging.INFO)
+_app_logger.propagate = False
+_log_listener = None
+
+def _start_log_listener():
+    # 输出线程不会被 fork 继承（如 gunicorn --preload 的 worker），子进程里换新队列并重新启动
+    global _log_listener
+    _log_handler.queue = queue.SimpleQueue()
+    _log_listener = logging.handlers.QueueListener(_log_handler.queue, _log_stream)
+    _log_listener.start()
+
+_start_log_listener()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_start_log_listener)
+atexit.register(lambda: _log_listener.stop())
 
 APP_DIR = Path(__file__).resolve().parent
 STATIC_DIR = APP_DIR / "static"
 
-app = FastAPI(title="phish-aggregator", version="0.1.0")
+app = FastAPI(title="phish-aggregator", version="0.1.0", default_response_class=ORJSONResponse)
 
 app.include_router(sources_router)
 app.include_router(scan_router)
 app.include_router(eval_router)
 app.include_router(datasets_router)
 
+def _cuda_visible() -> bool:
+    # device_count 经 NVML 查询，不初始化 CUDA，fork 前调用不影响 worker
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.device_count() > 0
+
+# 默认各模型在首次请求时才加载；多 worker 部署时可设置 AGG_PRELOAD_MODELS 并用
+# gunicorn --preload 启动，让模型在 fork 之前加载一次（写时复制共享），而不是每个 worker 各加载一份。
+# 有 GPU 时不预加载：fork 前建立的 CUDA 上下文在 worker 中不可用，URLTran 会静默退回启发式打分
+if PRELOAD_MODELS and _cuda_visible():
+    print("⚠️ CUDA device found, AGG_PRELOAD_MODELS ignored; models load lazily in each worker")
+else:
+    for _key in PRELOAD_MODELS:
+        get_registry().get_model(_key)
+
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
+def _not_modified(request: Request, response: Response) -> bool:
+    """条件请求判断：If-None-Match 为逗号分隔的标签列表（忽略弱标签前缀 W/，* 匹配任意）；
+    没有 If-None-Match 时再比较 If-Modified-Since 与 Last-Modified"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or response.headers["etag"] in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since:
+        return False
+    try:
+        return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(response.headers["last-modified"])
+    except (TypeError, ValueError):
+        return False
+
 @app.get("/", response_class=HTMLResponse)
-def index():
+def index(request: Request):
     index_path = STATIC_DIR / "index.html"
-    return HTMLResponse(index_path.read_text(encoding="utf-8"))
+    # FileResponse 直接发送文件并带 ETag/Last-Modified；浏览器缓存未失效时返回 304
+    response = FileResponse(index_path, media_type="text/html", stat_result=os.stat(index_path))
+    if _not_modified(request, response):
+        return Response(status_code=304, headers={k: response.headers[k] for k in ("etag", "last-modified")})
+    return response
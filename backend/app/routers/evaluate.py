@@ -1,31 +1,55 @@
+import asyncio
 from fastapi import APIRouter
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
+from typing import List, Optional
 from ..services.dataset import load_sample
-from ..services.list_loader import load_rulesets, check_with_rules
-from ..services.model_registry import ModelRegistry
-from ..services.aggregator import aggregate
+from ..services.list_loader import check_many_with_rules, selected_hit_keys
+from ..services.model_registry import get_registry
+from ..services.aggregator import make_aggregator
+from ..services.utils import extract_host
 from ..services.metrics import compute_metrics
 
 router = APIRouter(prefix="/api/evaluate", tags=["evaluate"])
-model_reg = ModelRegistry()
 
 class EvalRequest(BaseModel):
+    use_rules: List[str] = Field(default_factory=lambda: ["metamask_eth_phishing_detect","polkadot_js_phishing","phishing_database","cryptoscamdb"])
     use_models: List[str] = Field(default_factory=lambda: ["heuristic_baseline"])
     strategy: str = "any"
+    strategies: Optional[List[str]] = None  # 多策略对比（前端评测页使用）
     threshold: float = 0.5
 
 @router.post("")
-def evaluate(req: EvalRequest):
+async def evaluate(req: EvalRequest):
     urls, labels = load_sample()
-    rulesets = load_rulesets()
-    y_pred = []
-    rows = []
-    for url, yt in zip(urls, labels):
-        rhits, reasons = check_with_rules(url, rulesets)
-        preds = model_reg.predict_all(url, req.use_models, req.threshold)
-        agg = aggregate(rhits, preds, strategy=req.strategy, threshold=req.threshold)
-        y_pred.append(agg["label"])
-        rows.append({"url": url, "label": yt, "pred": agg["label"], "score": agg["score"], "rules": rhits, "models": preds})
-    m = compute_metrics(labels, y_pred)
-    return {"metrics": m, "details": rows}
+    selected = selected_hit_keys(req.use_rules)
+    # 规则匹配与模型推断每个 URL 只做一次，各策略复用；两者在线程池中并发执行
+    # host 也只解析一次，两条路径共用
+    hosts = await asyncio.to_thread(lambda: [extract_host(u) for u in urls])
+    rule_rows, all_preds = await asyncio.gather(
+        asyncio.to_thread(check_many_with_rules, urls, None, selected, hosts),
+        get_registry().predict_all_batch_async(urls, req.use_models, req.threshold, hosts=hosts),
+    )
+    per_url = [(url, yt, rhits, preds) for url, yt, (rhits, _), preds in zip(urls, labels, rule_rows, all_preds)]
+
+    if req.strategies is None:
+        agg_fn = make_aggregator(req.strategy, None, req.threshold)
+        y_pred = []
+        rows = []
+        for url, yt, rhits, preds in per_url:
+            agg = agg_fn(rhits, preds)
+            y_pred.append(agg["label"])
+            rows.append({"url": url, "label": yt, "pred": agg["label"], "score": agg["score"], "rules": rhits, "models": preds})
+        m = compute_metrics(labels, y_pred)
+        return {"metrics": m, "details": rows}
+
+    rows = [{"url": url, "true_label": yt, "rules": rhits, "models": preds, "strategies": {}} for url, yt, rhits, preds in per_url]
+    metrics = {}
+    for strategy in req.strategies:
+        agg_fn = make_aggregator(strategy, None, req.threshold)
+        y_pred = []
+        for row in rows:
+            agg = agg_fn(row["rules"], row["models"])
+            y_pred.append(agg["label"])
+            row["strategies"][strategy] = {"agg": agg}
+        metrics[strategy] = compute_metrics(labels, y_pred)
+    return {"metrics": metrics, "details": rows}
@@ -1,12 +1,16 @@
+import asyncio
+import orjson
+from dataclasses import dataclass
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
-from ..services.list_loader import load_rulesets, check_with_rules
-from ..services.model_registry import ModelRegistry
-from ..services.aggregator import aggregate
+from ..services.list_loader import check_many_with_rules, selected_hit_keys
+from ..services.model_registry import get_registry
+from ..services.aggregator import make_aggregator
+from ..services.utils import extract_host
 
 router = APIRouter(prefix="/api/scan", tags=["scan"])
-model_reg = ModelRegistry()
 
 class ScanRequest(BaseModel):
     urls: List[str]
@@ -16,21 +20,43 @@ class ScanRequest(BaseModel):
     threshold: float = 0.5
     weights: Optional[Dict[str, float]] = None
 
+@dataclass(slots=True)
+class ScanRow:
+    """单个 URL 的扫描结果；orjson 直接按字段序列化，输出与原字典结构一致。"""
+    url: str
+    rules: Dict[str, bool]
+    reasons: Dict[str, str]
+    models: Dict[str, dict]
+    agg: Dict[str, float]
+
+# 流式接口每次处理的 URL 数：块内仍走批量推断，块与块之间边算边输出
+STREAM_CHUNK_SIZE = 256
+
+async def _scan_rows(urls: List[str], req: ScanRequest, selected: frozenset) -> List[ScanRow]:
+    # 每个 URL 只解析一次 host，规则匹配与模型推断共用
+    hosts = await asyncio.to_thread(lambda: [extract_host(u) for u in urls])
+    # 规则匹配与各模型推断互不依赖，放到线程池中并发执行
+    rule_rows, all_preds = await asyncio.gather(
+        asyncio.to_thread(check_many_with_rules, urls, None, selected, hosts),
+        get_registry().predict_all_batch_async(urls, req.use_models, req.threshold, hosts=hosts),
+    )
+    agg_fn = make_aggregator(req.strategy, req.weights, req.threshold)
+    return [ScanRow(url, rhits, reasons, preds, agg_fn(rhits, preds)) for url, (rhits, reasons), preds in zip(urls, rule_rows, all_preds)]
+
 @router.post("")
-def scan(req: ScanRequest):
-    rulesets = load_rulesets()
-    results = []
-    for url in req.urls:
-        rhits, reasons = check_with_rules(url, rulesets)
-        # 只保留选择的规则
-        rhits = {k:v for k,v in rhits.items() if True}  # 简化：已加载的全部用
-        preds = model_reg.predict_all(url, req.use_models, req.threshold)
-        agg = aggregate(rhits, preds, strategy=req.strategy, weights=req.weights, threshold=req.threshold)
-        results.append({
-            "url": url,
-            "rules": rhits,
-            "reasons": reasons,
-            "models": preds,
-            "agg": agg
-        })
-    return {"results": results}
+async def scan(req: ScanRequest):
+    selected = selected_hit_keys(req.use_rules)
+    # 直接返回 ORJSONResponse，跳过 jsonable_encoder 对 dataclass 的逐字段转换
+    return ORJSONResponse({"results": await _scan_rows(req.urls, req, selected)})
+
+@router.post("/stream")
+async def scan_stream(req: ScanRequest):
+    """逐行输出 NDJSON，大批量扫描时不必在内存中拼出完整结果。"""
+    selected = selected_hit_keys(req.use_rules)
+
+    async def gen():
+        for start in range(0, len(req.urls), STREAM_CHUNK_SIZE):
+            for row in await _scan_rows(req.urls[start:start + STREAM_CHUNK_SIZE], req, selected):
+                yield orjson.dumps(row) + b"\n"
+
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
@@ -1,11 +1,10 @@
 from fastapi import APIRouter
 from ..config import RULE_SOURCES as RULE_SOURCES_CFG, MODEL_SOURCES as MODEL_SOURCES_CFG
-from ..services.model_registry import ModelRegistry
-from pathlib import Path
+from ..services.model_registry import get_registry
+from ..services.list_loader import reload_rulesets
 from ..config import RULES_DIR, MODELS_DIR
 
 router = APIRouter(prefix="/api/sources", tags=["sources"])
-model_reg = ModelRegistry()
 
 @router.get("/rules")
 def list_rule_sources():
@@ -18,7 +17,7 @@ def list_rule_sources():
 @router.get("/models")
 def list_model_sources():
     # 把 config 里列出的 + 已下载但未注册的都返回
-    reg = model_reg.list_models()
+    reg = get_registry().list_models()
     out = []
     keys = set()
     for key, meta in MODEL_SOURCES_CFG.items():
@@ -36,3 +35,9 @@ def list_model_sources():
         if k not in keys:
             out.append({"key": k, "name": v.get("name", k), "installed": True, "homepage": "local"})
     return {"models": out}
+
+@router.post("/reload")
+def reload_rule_sources():
+    # 规则文件重新拉取后调用，清空已缓存的规则集
+    rulesets = reload_rulesets()
+    return {"ok": True, "rulesets": sorted(k for k in rulesets if not k.startswith("_"))}
@@ -1,49 +1,50 @@
 from __future__ import annotations
-from typing import Dict
+import math
+from typing import Callable, Dict
 
-def aggregate(rule_hits: Dict[str, bool], model_preds: Dict[str, dict], strategy="any", weights=None, threshold=0.5) -> Dict[str, float]:
+Aggregator = Callable[[Dict[str, bool], Dict[str, dict]], Dict[str, float]]
+
+def make_aggregator(strategy="any", weights=None, threshold=0.5) -> Aggregator:
     """
+    按策略生成专用的聚合函数（策略分支只判断一次，threshold/weights 闭包捕获），
+    批量场景下每个请求构造一次，逐 URL 调用。
     strategy:
       - "any": 任一规则命中 或 任一模型≥thr 即恶意
       - "weighted": 对模型概率做加权平均 + 规则命中直接加分
     """
-    decision = 0
-    score = 0.0
-
     if strategy == "any":
-        if any(v for v in rule_hits.values()):
-            decision = 1
-            score = 1.0
-        else:
-            maxp = 0.0
-            for v in model_preds.values():
-                p = v.get("proba") or 0.0
-                if p > maxp: maxp = p
-            decision = int(maxp >= threshold)
-            score = maxp
-        return {"label": decision, "score": score}
+        def _aggregate_any(rule_hits: Dict[str, bool], model_preds: Dict[str, dict]) -> Dict[str, float]:
+            if True in rule_hits.values():
+                return {"label": 1, "score": 1.0}
+            maxp = max((v.get("proba") or 0.0 for v in model_preds.values()), default=0.0)
+            return {"label": int(maxp >= threshold), "score": maxp}
+        return _aggregate_any
 
     # weighted
-    wsum = 0.0
-    psum = 0.0
-    if weights:
-        for k, v in model_preds.items():
-            p = v.get("proba")
-            if p is None: 
-                continue
-            w = float(weights.get(k, 1.0))
-            wsum += w
-            psum += w * p
-    else:
-        cnt = 0
-        for v in model_preds.values():
-            p = v.get("proba")
-            if p is None: continue
-            psum += p
-            cnt += 1
-        wsum = max(1, cnt)
-    avgp = psum / wsum
-    # 规则命中给 0.2 加成（最多 1.0）
-    if any(v for v in rule_hits.values()):
-        avgp = min(1.0, avgp + 0.2)
-    return {"label": int(avgp >= threshold), "score": avgp}
+    def _aggregate_weighted(rule_hits: Dict[str, bool], model_preds: Dict[str, dict]) -> Dict[str, float]:
+        wsum = 0.0
+        psum = 0.0
+        if weights:
+            for k, v in model_preds.items():
+                p = v.get("proba")
+                if p is None: 
+                    continue
+                w = float(weights.get(k, 1.0))
+                wsum += w
+                psum += w * p
+        else:
+            probs = [v["proba"] for v in model_preds.values() if v.get("proba") is not None]
+            psum = math.fsum(probs)
+            wsum = max(1, len(probs))
+        avgp = psum / wsum
+        # 规则命中给 0.2 加成（最多 1.0）
+        if True in rule_hits.values():
+            avgp += 0.2
+            if avgp > 1.0:
+                avgp = 1.0
+        return {"label": int(avgp >= threshold), "score": avgp}
+    return _aggregate_weighted
+
+def aggregate(rule_hits: Dict[str, bool], model_preds: Dict[str, dict], strategy="any", weights=None, threshold=0.5) -> Dict[str, float]:
+    """单次聚合；批量调用请用 make_aggregator 预先生成聚合函数。"""
+    return make_aggregator(strategy, weights, threshold)(rule_hits, model_preds)
@@ -1,17 +1,33 @@
 from __future__ import annotations
 from pathlib import Path
+from functools import lru_cache
 import csv
 from typing import List, Tuple
 from ..config import DATASETS_DIR
 
+SAMPLE_PATH = DATASETS_DIR / "sample" / "urls_labeled.csv"
+
 def load_sample() -> Tuple[list[str], list[int]]:
-    path = DATASETS_DIR / "sample" / "urls_labeled.csv"
-    if not path.exists():
+    """读取样例数据集；按文件 mtime 缓存，文件修改后自动失效。"""
+    try:
+        mtime = SAMPLE_PATH.stat().st_mtime_ns
+    except OSError:
         return [], []
+    return _load_sample_cached(mtime)
+
+@lru_cache(maxsize=1)
+def _load_sample_cached(mtime: int) -> Tuple[list[str], list[int]]:
     urls, labels = [], []
-    with path.open("r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
+    with SAMPLE_PATH.open("r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return urls, labels
+        # 按表头定位列，逐行只取两列，不为每行构造 dict
+        iu, il = header.index("url"), header.index("label")
         for row in reader:
-            urls.append(row["url"])
-            labels.append(int(row["label"]))
+            if not row:
+                continue
+            urls.append(row[iu])
+            labels.append(int(row[il]))
     return urls, labels
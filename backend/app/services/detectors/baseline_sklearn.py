@@ -1,27 +1,38 @@
 from __future__ import annotations
-from typing import Dict
+from typing import Dict, List, Optional
+import numpy as np
 from ..utils import url_char_features, extract_host
 
 class HeuristicBaseline:
     """一个轻量启发式“模型”——根据 URL 字符特征、可疑词等打分。"""
+    # 打分用到 host，接受调用方预先解析好的 hosts
+    uses_host = True
+
     def __init__(self, name="heuristic_baseline"):
         self.name = name
 
-    def predict_proba(self, url: str) -> float:
-        f = url_char_features(url)
-        score = 0.0
+    def predict_proba(self, url: str, host: Optional[str] = None) -> float:
+        return float(self.predict_proba_batch([url], None if host is None else [host])[0])
+
+    def predict_proba_batch(self, urls: List[str], hosts: Optional[List[str]] = None) -> np.ndarray:
+        """批量打分：逐条提取特征后，打分公式在整批数组上一次算完。"""
+        n = len(urls)
+        if hosts is None:
+            hosts = [extract_host(u) for u in urls]
+        feats = [url_char_features(u, h) for u, h in zip(urls, hosts)]
+        lens = np.fromiter((f["len"] for f in feats), dtype=np.float64, count=n)
+        special_ratio = np.fromiter((f["special_ratio"] for f in feats), dtype=np.float64, count=n)
+        susp = np.fromiter((f["susp_words"] for f in feats), dtype=np.int64, count=n)
+        digits = np.fromiter((f["digits"] for f in feats), dtype=np.int64, count=n)
+        dashes = np.fromiter((h.count("-") for h in hosts), dtype=np.int64, count=n)
         # 简单经验打分（可按需调整权重）
-        score += 0.0008 * f["len"]
-        score += 0.8    * f["special_ratio"]
-        score += 0.6    * (f["susp_words"] > 0)
-        score += 0.2    * (f["digits"] > 5)
-        host = extract_host(url)
-        if host.count("-") >= 2:
-            score += 0.2
+        score = 0.0008 * lens
+        score += 0.8 * special_ratio
+        score += 0.6 * (susp > 0)
+        score += 0.2 * (digits > 5)
+        score += 0.2 * (dashes >= 2)
         # 归一化到 [0,1]
-        if score < 0: score = 0.0
-        if score > 1: score = 1.0
-        return float(score)
+        return np.clip(score, 0.0, 1.0, out=score)
 
     def predict_label(self, url: str, threshold=0.5) -> int:
         return int(self.predict_proba(url) >= threshold)
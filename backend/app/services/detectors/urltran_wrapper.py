@@ -1,9 +1,52 @@
 from __future__ import annotations
-from typing import Dict
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import logging
+import os
+import tempfile
+import threading
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import re
+import string
 import numpy as np
+from ...config import MODELS_DIR, TORCH_THREADS, URLTRAN_MAX_BATCH, URLTRAN_DTYPE, URLTRAN_COMPILE, URLTRAN_BACKEND, URLTRAN_IPEX, URLTRAN_QUANTIZE, URLTRAN_CASCADE
+
+log = logging.getLogger(__name__)
+
+_TORCH_VERSION = tuple(int(x) for x in re.findall(r'\d+', torch.__version__)[:2])
+
+# 本地生成的文件放在单独的缓存目录，不写进 fetch_models.py 克隆仓库用的 models/urltran
+URLTRAN_CACHE_DIR = MODELS_DIR / ".cache" / "urltran"
+# 训练好的分类头（bert-base-uncased 自带的分类层是随机初始化的，每次进程启动输出都不同），
+# 由 scripts/train_urltran_head.py 生成
+CLASSIFIER_HEAD_PATH = URLTRAN_CACHE_DIR / "classifier_head.pt"
+# ONNX 导出并 int8 量化的结果（URLTRAN_BACKEND=onnx 时使用）
+ONNX_INT8_PATH = URLTRAN_CACHE_DIR / "urltran.int8.onnx"
+
+_CLEAN_RE = re.compile(r'[^\w\s\-\.\/\:]')
+# ASCII 字符的清洗表（与 _CLEAN_RE 逐字符等价），纯 ASCII 的 URL 用 str.translate 一次扫描完成
+_CLEAN_TABLE = str.maketrans({chr(c): ' ' for c in range(128) if _CLEAN_RE.match(chr(c))})
+
+# 启发式备选方案用到的正则，模块加载时编译一次
+_SPECIAL_RE = re.compile(r'[^\w\-\.]')
+_DIGIT_RE = re.compile(r'\d')
+_IP_RE = re.compile(r'\d+\.\d+\.\d+\.\d+')
+_SUSPICIOUS_RE = re.compile(r'(login|signin|secure|account|update|verify|bank|paypal|apple|microsoft|google|facebook)')
+# 纯 ASCII URL 的字符计数：删除表在 C 层一次扫描，代替逐字符的正则匹配
+_DEL_DIGITS = str.maketrans("", "", string.digits)
+_KEEP_SPECIAL = str.maketrans("", "", string.ascii_letters + string.digits + "_-.")
+
+# 按 URL 缓存模型输出的条数上限（重复扫描同一批 URL 时直接命中）
+PREDICT_CACHE_SIZE = 65536
+
+def _clean_url(url: str) -> str:
+    """小写并把字母数字、下划线、空白、-./: 以外的字符替换为空格"""
+    u = url.strip().lower()
+    if u.isascii():
+        return u.translate(_CLEAN_TABLE)
+    # 非 ASCII 需按 Unicode 语义判断单词字符与空白
+    return _CLEAN_RE.sub(' ', u)
 
 class URLTranWrapper:
     """URLTran模型包装器 - 使用预训练的BERT模型进行URL分类"""
@@ -13,125 +56,378 @@ class URLTranWrapper:
         self.model_name = "bert-base-uncased"
         self.tokenizer = None
         self.model = None
+        self.ort_session = None
+        self.jit_model = None
+        self._ipex_applied = False
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        # 清理后的 URL -> 钓鱼概率 的 LRU 缓存；模型重新加载（新实例）时自然失效
+        self._cache: "OrderedDict[str, float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._configure_threads()
         self._load_model()
 
+    def _configure_threads(self):
+        """按 TORCH_THREADS 设置 CPU 推断线程；单次前向内部并行即可，inter-op 线程设为 1"""
+        if self.device.type != "cpu" or TORCH_THREADS is None:
+            return
+        torch.set_num_threads(max(1, TORCH_THREADS))
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # inter-op 线程池已启动后不能再修改
+            pass
+
     def _load_model(self):
         """加载预训练模型"""
         try:
             print(f"Loading {self.model_name} for URLTran...")
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            # 固定使用 Rust 实现的 fast tokenizer，整批分词在 Rust 侧完成
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, use_fast=True)
             self.model = AutoModelForSequenceClassification.from_pretrained(
                 self.model_name,
                 num_labels=2,
-                problem_type="single_label_classification"
+                problem_type="single_label_classification",
+                # TorchScript 需要模型返回 tuple 而非 ModelOutput
+                torchscript=URLTRAN_BACKEND == "torchscript"
             )
-            self.model.to(self.device)
+            self.model.to(self.device, dtype=self._resolve_dtype())
+            # 先把模型放到目标设备，分类头权重再直接加载到该设备上
+            self._load_classifier_head()
             self.model.eval()
+            for param in self.model.parameters():
+                param.requires_grad_(False)
+            if URLTRAN_QUANTIZE and self.device.type == "cpu" and URLTRAN_BACKEND != "onnx":
+                self._quantize_dynamic()
+            elif URLTRAN_IPEX and self.device.type == "cpu" and URLTRAN_BACKEND != "onnx":
+                self._apply_ipex()
+            if URLTRAN_BACKEND == "onnx" and self.device.type == "cpu":
+                self._init_onnx()
+            elif URLTRAN_BACKEND == "torchscript":
+                self._init_torchscript()
+            if URLTRAN_COMPILE and self.ort_session is None and self.jit_model is None:
+                # 批内按最长序列补齐，序列长度会变化，用 dynamic 避免每种长度重新编译；
+                # 已用 ipex 优化时交给 ipex 的编译后端
+                backend = "ipex" if self._ipex_applied else "inductor"
+                eager = self.model
+                self.model = torch.compile(self.model, dynamic=True, backend=backend)
+                # 加载时先跑一次前向，把编译耗时放在启动阶段而不是第一个请求上；
+                # 编译失败（如环境里没有 C++ 编译器）时退回未编译的模型，避免每次请求都重试编译
+                if self._forward(["http://example.com/login", "http://example.com"]) is None:
+                    print(f"❌ torch.compile ({backend}) failed, URLTran stays on eager torch")
+                    self.model = eager
             print(f"✅ {self.model_name} loaded successfully")
         except Exception as e:
             print(f"❌ Failed to load {self.model_name}: {e}")
             # 如果模型加载失败，使用启发式方法作为备选
             self.tokenizer = None
             self.model = None
+            self.jit_model = None
+            self.ort_session = None
 
-    def _preprocess_url(self, url: str) -> Dict:
-        """预处理URL用于模型输入"""
-        if not self.tokenizer:
-            return None
+    def _resolve_dtype(self) -> torch.dtype:
+        """按 URLTRAN_DTYPE 配置选择推断精度"""
+        if URLTRAN_DTYPE == "auto":
+            return torch.float16 if self.device.type == "cuda" else torch.bfloat16
+        if URLTRAN_DTYPE in ("float16", "bfloat16"):
+            return getattr(torch, URLTRAN_DTYPE)
+        return torch.float32
 
+    def _init_onnx(self):
+        """导出 ONNX 并做 int8 动态量化（已有且不旧于分类头时复用），创建 onnxruntime 会话"""
         try:
-            # 清理URL
-            url = url.strip().lower()
+            import onnxruntime as ort
+        except ImportError as e:
+            print(f"❌ onnxruntime not available, URLTran stays on torch: {e}")
+            return
+        if self.model.dtype != torch.float32:
+            print("❌ ONNX export needs float32 weights, URLTran stays on torch")
+            return
+        try:
+            head_mtime = CLASSIFIER_HEAD_PATH.stat().st_mtime if CLASSIFIER_HEAD_PATH.exists() else 0
+            if not ONNX_INT8_PATH.exists() or ONNX_INT8_PATH.stat().st_mtime < head_mtime:
+                self._export_onnx()
+            # 安装了 onnxruntime-openvino 时优先用 OpenVINO 执行 int8 图，否则用默认 CPU 执行器
+            providers = [p for p in ("OpenVINOExecutionProvider", "CPUExecutionProvider") if p in ort.get_available_providers()]
+            self.ort_session = ort.InferenceSession(str(ONNX_INT8_PATH), providers=providers)
+            print(f"✅ URLTran ONNX int8 session ready ({providers[0]}): {ONNX_INT8_PATH}")
+        except Exception as e:
+            print(f"❌ Failed to prepare URLTran ONNX session: {e}")
+            self.ort_session = None
+            return
+        self.jit_model = None
+        self._ipex_applied = False
+
+    def _export_onnx(self):
+        """导出并量化到本进程独占的临时文件，完成后原子替换，多个 worker 同时导出也不会读到写了一半的文件"""
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        URLTRAN_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=URLTRAN_CACHE_DIR) as tmp:
+            fp32_path = os.path.join(tmp, "urltran.onnx")
+            int8_path = os.path.join(tmp, "urltran.int8.onnx")
+            dummy = self.tokenizer(["http://example.com/login"], return_tensors="pt")
+            torch.onnx.export(
+                self.model,
+                (dummy["input_ids"], dummy["attention_mask"]),
+                fp32_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["logits"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "seq"},
+                    "attention_mask": {0: "batch", 1: "seq"},
+                    "logits": {0: "batch"},
+                },
+                opset_version=17,
+            )
+            quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+            os.replace(int8_path, ONNX_INT8_PATH)
+
+    def _quantize_dynamic(self):
+        """Linear 层 int8 动态量化：权重体积约为 1/4，x86 上走 fbgemm 的 int8 GEMM"""
+        if self.model.dtype != torch.float32:
+            print("❌ int8 quantization needs float32 weights, skipped")
+            return
+        engines = torch.backends.quantized.supported_engines
+        if "fbgemm" in engines:
+            torch.backends.quantized.engine = "fbgemm"
+        elif "qnnpack" in engines:
+            torch.backends.quantized.engine = "qnnpack"
+        self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        print("✅ URLTran Linear layers quantized to int8")
 
-            # 特殊字符处理
-            url = re.sub(r'[^\w\s\-\.\/\:]', ' ', url)
+    def _apply_ipex(self):
+        """用 ipex 重排权重布局并选用 oneDNN 内核（bfloat16 时可用 AMX/AVX512-BF16）"""
+        try:
+            import intel_extension_for_pytorch as ipex
+        except ImportError as e:
+            print(f"❌ intel_extension_for_pytorch not available: {e}")
+            return
+        dtype = self.model.dtype if self.model.dtype == torch.bfloat16 else None
+        self.model = ipex.optimize(self.model, dtype=dtype)
+        self._ipex_applied = True
+        print("✅ URLTran optimized with ipex")
+
+    def _init_torchscript(self):
+        """trace 前向并 freeze，去掉 Python 层分发开销；失败时保留 eager 模型"""
+        try:
+            dummy = self.tokenizer(["http://example.com/login"], return_tensors="pt", padding="max_length", max_length=128)
+            args = (dummy["input_ids"].to(self.device), dummy["attention_mask"].to(self.device))
+            with torch.no_grad():
+                traced = torch.jit.trace(self.model, args, strict=False)
+                self.jit_model = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+            print("✅ URLTran TorchScript model ready")
+        except Exception as e:
+            print(f"❌ Failed to trace URLTran, staying on eager torch: {e}")
+            self.jit_model = None
+            return
+        # freeze 后权重已作为常量存进 jit_model，释放 eager 模型，避免同一份权重占两份内存
+        self.model = None
+        self._ipex_applied = False
 
-            # 分词
+    def _load_classifier_head(self):
+        """加载保存的分类头权重（存在时），让输出确定且有意义"""
+        if not CLASSIFIER_HEAD_PATH.exists():
+            print(f"⚠️ {CLASSIFIER_HEAD_PATH} not found, URLTran classifier head is randomly initialized (run scripts/train_urltran_head.py)")
+            return
+        try:
+            # torch>=2.1 支持 mmap：权重文件按需映射，不在 CPU 上额外保留一份
+            kwargs = {"mmap": True} if _TORCH_VERSION >= (2, 1) else {}
+            state = torch.load(CLASSIFIER_HEAD_PATH, map_location=self.device, weights_only=True, **kwargs)
+            self.model.classifier.load_state_dict(state)
+            print(f"✅ URLTran classifier head loaded from {CLASSIFIER_HEAD_PATH}")
+        except Exception as e:
+            print(f"❌ Failed to load URLTran classifier head: {e}")
+
+    def _tokenize(self, cleaned: List[str]) -> Dict:
+        """对已清理的 URL 整批分词并移动到设备"""
+        if not self.tokenizer:
+            return None
+
+        try:
+            # 分词：单条不补齐，多条只补齐到批内最长序列（TorchScript 按 trace 时的形状固定补齐到 max_length）
+            # GPU 上把长度补到 8 的倍数，矩阵乘可以走 Tensor Core
+            pad_to_multiple_of = None
+            if self.jit_model is not None:
+                padding = "max_length"
+            elif self.device.type == "cuda":
+                padding, pad_to_multiple_of = "longest", 8
+            else:
+                padding = "longest" if len(cleaned) > 1 else False
             inputs = self.tokenizer(
-                url,
+                cleaned,
                 return_tensors="pt",
                 max_length=128,
                 truncation=True,
-                padding=True
+                padding=padding,
+                pad_to_multiple_of=pad_to_multiple_of
             )
 
-            # 移动到设备
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            # 移动到设备：GPU 上先锁页再异步拷贝，与后续 kernel 启动重叠
+            if self.device.type == "cuda":
+                inputs = {k: v.pin_memory().to(self.device, non_blocking=True) for k, v in inputs.items()}
+            else:
+                inputs = {k: v.to(self.device) for k, v in inputs.items()}
 
             return inputs
         except Exception as e:
-            print(f"URL preprocessing failed: {e}")
+            log.warning("URL preprocessing failed: %s", e)
             return None
 
+    @staticmethod
+    def _fallback_features(url: str) -> tuple:
+        """启发式特征：(长度, 特殊字符数, 数字数, 子域名数, 是否含 IP, 可疑词数)"""
+        if url.isascii():
+            specials = len(url.translate(_KEEP_SPECIAL))
+            digits = len(url) - len(url.translate(_DEL_DIGITS))
+        else:
+            # 非 ASCII 需按 Unicode 语义判断数字/单词字符
+            specials = len(_SPECIAL_RE.findall(url))
+            digits = len(_DIGIT_RE.findall(url))
+        dots = url.count('.')
+        return (
+            len(url),
+            specials,
+            digits,
+            dots - 1 if dots > 1 else 0,
+            _IP_RE.search(url) is not None,
+            len(_SUSPICIOUS_RE.findall(url.lower())),
+        )
+
     def _heuristic_fallback(self, url: str) -> float:
         """当模型不可用时的启发式备选方案"""
-        # 简单的URL特征检测
-        features = {
-            'length': len(url),
-            'special_chars': len(re.findall(r'[^\w\-\.]', url)),
-            'digits': len(re.findall(r'\d', url)),
-            'subdomains': url.count('.') - 1 if url.count('.') > 1 else 0,
-            'has_ip': bool(re.search(r'\d+\.\d+\.\d+\.\d+', url)),
-            'suspicious_words': len(re.findall(
-                r'(login|signin|secure|account|update|verify|bank|paypal|apple|microsoft|google|facebook)',
-                url.lower()
-            ))
-        }
-
-        # 简单打分
-        score = 0.0
+        return self._heuristic_fallback_batch([url])[0]
 
-        # 长度惩罚
-        if features['length'] > 100:
-            score += 0.1
-        elif features['length'] > 50:
-            score += 0.05
+    def _heuristic_fallback_batch(self, urls: List[str]) -> List[float]:
+        """启发式备选方案的批量版本：逐条提取特征，打分公式在整批数组上一次算完"""
+        feats = np.array([self._fallback_features(u) for u in urls], dtype=np.float64).reshape(-1, 6)
+        length, specials, digits, subdomains, has_ip, susp = feats.T
 
+        # 长度惩罚
+        score = np.where(length > 100, 0.1, np.where(length > 50, 0.05, 0.0))
         # 特殊字符惩罚
-        score += min(features['special_chars'] * 0.05, 0.3)
-
+        score += np.minimum(specials * 0.05, 0.3)
         # 数字惩罚
-        score += min(features['digits'] * 0.02, 0.2)
-
+        score += np.minimum(digits * 0.02, 0.2)
         # 子域名惩罚
-        score += min(features['subdomains'] * 0.1, 0.3)
-
+        score += np.minimum(subdomains * 0.1, 0.3)
         # IP地址直接惩罚
-        if features['has_ip']:
-            score += 0.4
-
+        score += 0.4 * has_ip
         # 可疑词惩罚
-        score += min(features['suspicious_words'] * 0.15, 0.5)
+        score += np.minimum(susp * 0.15, 0.5)
 
-        return min(score, 1.0)
+        return np.minimum(score, 1.0).tolist()
 
     def predict_proba(self, url: str) -> float:
         """预测URL为钓鱼网站的概率"""
-        if not self.model or not self.tokenizer:
+        return self.predict_proba_batch([url])[0]
+
+    def predict_proba_batch(self, urls: List[str]) -> List[float]:
+        """批量预测：缓存命中的直接返回，其余整批一次前向"""
+        if not urls:
+            return []
+        if not self.tokenizer or (self.model is None and self.jit_model is None):
             # 使用启发式备选方案
-            return self._heuristic_fallback(url)
+            return self._heuristic_fallback_batch(urls)
+
+        # 以清理后的文本（即模型实际看到的输入）为缓存键：大小写、首尾空白等不同写法共用一条缓存
+        out: List = [None] * len(urls)
+        misses: Dict[str, List[int]] = {}
+        heuristic = None
+        if URLTRAN_CASCADE:
+            # 级联：启发式已足够确定的 URL 直接采用启发式分数
+            heuristic = self._heuristic_fallback_batch(urls)
+            for i, (url, h) in enumerate(zip(urls, heuristic)):
+                if h >= 0.9 or (h <= 0.05 and len(url) < 40):
+                    out[i] = h
+        with self._cache_lock:
+            for i, url in enumerate(urls):
+                if out[i] is not None:
+                    continue
+                key = _clean_url(url)
+                p = self._cache.get(key)
+                if p is None:
+                    misses.setdefault(key, []).append(i)
+                    self._cache_misses += 1
+                else:
+                    self._cache.move_to_end(key)
+                    out[i] = p
+                    self._cache_hits += 1
+        if not misses:
+            return out
 
+        todo = list(misses)
+        probs = self._predict_uncached(todo)
+        if probs is None:
+            # 推理失败时用启发式补齐，但不写入缓存
+            idx = [i for key in todo for i in misses[key]]
+            if heuristic is not None:
+                # 级联阶段已算过整批启发式分数，直接复用
+                for i in idx:
+                    out[i] = heuristic[i]
+            else:
+                for i, p in zip(idx, self._heuristic_fallback_batch([urls[i] for i in idx])):
+                    out[i] = p
+            return out
+        with self._cache_lock:
+            for key, p in zip(todo, probs):
+                self._cache[key] = p
+                for i in misses[key]:
+                    out[i] = p
+            while len(self._cache) > PREDICT_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return out
+
+    def _predict_uncached(self, cleaned: List[str]) -> Optional[List[float]]:
+        """按长度排序后分块前向：块内长度相近，补齐浪费少，单块大小受 URLTRAN_MAX_BATCH 限制；失败时返回 None"""
+        order = sorted(range(len(cleaned)), key=lambda i: len(cleaned[i]))
+        size = max(1, URLTRAN_MAX_BATCH)
+        out = [0.0] * len(cleaned)
+        for start in range(0, len(order), size):
+            idx = order[start:start + size]
+            probs = self._forward([cleaned[i] for i in idx])
+            if probs is None:
+                return None
+            for i, p in zip(idx, probs):
+                out[i] = p
+        return out
+
+    def _forward(self, cleaned: List[str]) -> Optional[List[float]]:
+        """对一块已清理的 URL 一次前向，分摊逐条调用的开销；失败时返回 None"""
         try:
             # 预处理
-            inputs = self._preprocess_url(url)
+            inputs = self._tokenize(cleaned)
             if inputs is None:
-                return self._heuristic_fallback(url)
+                return None
 
-            # 模型推理
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                logits = outputs.logits
+            if self.ort_session is not None:
+                feeds = {k: inputs[k].cpu().numpy() for k in ("input_ids", "attention_mask")}
+                logits = self.ort_session.run(None, feeds)[0]
+                # 二分类 softmax 的钓鱼类别概率即 sigmoid(logit_1 - logit_0)
+                return (1.0 / (1.0 + np.exp(logits[:, 0] - logits[:, 1]))).tolist()
 
-                # 获取概率
-                probabilities = torch.softmax(logits, dim=-1)
-                phishing_prob = probabilities[0][1].item()  # 假设索引1是钓鱼类别
+            # 模型推理（inference_mode 比 no_grad 省去版本计数等开销）
+            with torch.inference_mode():
+                if self.jit_model is not None:
+                    logits = self.jit_model(inputs["input_ids"], inputs["attention_mask"])[0]
+                else:
+                    # torchscript=True 加载的模型返回 tuple，按下标取 logits 对 ModelOutput 同样适用
+                    logits = self.model(**inputs)[0]
+                # 半精度推断时回到 float32 再计算概率
+                logits = logits.float()
 
-                return float(phishing_prob)
+                # 二分类 softmax 的钓鱼类别概率（假设索引1是钓鱼类别）即 sigmoid(logit_1 - logit_0)，
+                # 不再生成完整的概率矩阵；整块结果一次 tolist() 拷回 CPU
+                return torch.sigmoid(logits[:, 1] - logits[:, 0]).tolist()
 
         except Exception as e:
-            print(f"URLTran prediction failed: {e}")
-            return self._heuristic_fallback(url)
+            log.warning("URLTran prediction failed: %s", e)
+            return None
+
+    def cache_info(self) -> Dict[str, int]:
+        """预测缓存的命中统计"""
+        with self._cache_lock:
+            return {"hits": self._cache_hits, "misses": self._cache_misses, "size": len(self._cache), "maxsize": PREDICT_CACHE_SIZE}
 
     def predict_label(self, url: str, threshold=0.5) -> int:
         """预测URL的标签（0=正常，1=钓鱼）"""
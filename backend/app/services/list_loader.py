@@ -1,11 +1,62 @@
 from __future__ import annotations
 from pathlib import Path
+from functools import lru_cache
 import json, re
-from typing import Dict, Set, Tuple, List
+import orjson
+from typing import Dict, Set, Tuple, List, Optional
 from .utils import extract_host
 
 from ..config import RULES_DIR
 
+# 规则源 key（config.RULE_SOURCES）-> check_with_rules 返回的命中 key
+RULE_HIT_KEYS = {
+    "metamask_eth_phishing_detect": ("metamask",),
+    "polkadot_js_phishing": ("polkadot",),
+    "phishing_database": ("phishing_database_domains", "phishing_database_links"),
+    "cryptoscamdb": ("cryptoscamdb",),
+}
+
+def selected_hit_keys(use_rules: List[str]) -> frozenset:
+    """把请求里选择的规则源换算成命中 key 集合（请求开始时算一次，循环内只做成员判断）。"""
+    return frozenset(k for r in use_rules for k in RULE_HIT_KEYS.get(r, (r,)))
+
+def _rules_fingerprint() -> Tuple[Tuple[str, int, int], ...]:
+    """规则目录下各文件的 (文件名, mtime, 大小)，文件被重新拉取后指纹随之变化。"""
+    out = []
+    for p in sorted(RULES_DIR.glob("*__*")):
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        out.append((p.name, st.st_mtime_ns, st.st_size))
+    return tuple(out)
+
+@lru_cache(maxsize=1)
+def _load_rulesets_cached(fingerprint: Tuple[Tuple[str, int, int], ...]) -> Dict[str, dict]:
+    return load_rulesets()
+
+def get_rulesets() -> Dict[str, dict]:
+    """返回缓存的规则集；规则文件未变化时不再重复读取/解析。"""
+    return _load_rulesets_cached(_rules_fingerprint())
+
+def reload_rulesets() -> Dict[str, dict]:
+    """清空缓存并重新加载规则集。"""
+    _load_rulesets_cached.cache_clear()
+    return get_rulesets()
+
+def _load_json(path: Path):
+    """用 orjson 直接解析字节；orjson 不接受的非标准 JSON（如 NaN）再交给标准库。"""
+    data = path.read_bytes()
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return json.loads(data.decode("utf-8"))
+
+def _read_list_file(path: Path) -> Set[str]:
+    """逐行读取清单文件（跳过空行和 # 注释），不把整个文件读成一个字符串再切分。"""
+    with path.open("r", encoding="utf-8", errors="ignore") as f:
+        return {l.strip() for l in f if l.strip() and not l.startswith("#")}
+
 def load_rulesets() -> Dict[str, dict]:
     """加载已下载的清单到内存结构。"""
     rs = {}
@@ -13,7 +64,7 @@ def load_rulesets() -> Dict[str, dict]:
     meta_path = RULES_DIR / "metamask_eth_phishing_detect__config.json"
     if meta_path.exists():
         try:
-            cfg = json.loads(meta_path.read_text(encoding="utf-8"))
+            cfg = _load_json(meta_path)
             bl = set(cfg.get("blocklist", []))
             al = set(cfg.get("allowlist", []))
             rs["metamask"] = {"block": bl, "allow": al}
@@ -24,7 +75,7 @@ def load_rulesets() -> Dict[str, dict]:
     pd_all = RULES_DIR / "polkadot_js_phishing__all.json"
     if pd_all.exists():
         try:
-            data = json.loads(pd_all.read_text(encoding="utf-8"))
+            data = _load_json(pd_all)
             # all.json 为对象映射 { "domain": {...}, ... } 或数组（历史不同版本），做兼容
             if isinstance(data, dict):
                 domains = set(data.keys())
@@ -40,16 +91,14 @@ def load_rulesets() -> Dict[str, dict]:
     pdb_links = RULES_DIR / "phishing_database__phishing-links-ACTIVE-NOW.txt"
     if pdb_links.exists():
         try:
-            lines = [l.strip() for l in pdb_links.read_text(encoding="utf-8", errors="ignore").splitlines() if l.strip() and not l.startswith("#")]
-            rs["phishing_db_links"] = {"urls": set(lines)}
+            rs["phishing_db_links"] = {"urls": _read_list_file(pdb_links)}
         except Exception:
             pass
 
     pdb_domains = RULES_DIR / "phishing_database__phishing-domains-ACTIVE.txt"
     if pdb_domains.exists():
         try:
-            lines = [l.strip() for l in pdb_domains.read_text(encoding="utf-8", errors="ignore").splitlines() if l.strip() and not l.startswith("#")]
-            rs["phishing_db_domains"] = {"block": set(lines)}
+            rs["phishing_db_domains"] = {"block": _read_list_file(pdb_domains)}
         except Exception:
             pass
 
@@ -57,7 +106,7 @@ def load_rulesets() -> Dict[str, dict]:
     cs_api = RULES_DIR / "cryptoscamdb__blacklist_api.json"
     if cs_api.exists():
         try:
-            data = json.loads(cs_api.read_text(encoding="utf-8"))
+            data = _load_json(cs_api)
             items = set()
             # API 返回 payload 结构：{"result": {"active": {...}}}（不同版本可能不同，尽量兼容）
             for section in data.values():
@@ -70,24 +119,50 @@ def load_rulesets() -> Dict[str, dict]:
         except Exception:
             pass
 
+    _build_index(rs)
     return rs
 
-def check_with_rules(url: str, rulesets: Dict[str, dict]) -> Tuple[Dict[str, bool], Dict[str, str]]:
-    """对单个 URL 进行规则匹配；返回 (命中字典, 命中依据)。"""
-    host = extract_host(url)
+def _build_index(rs: Dict[str, dict]) -> None:
+    """合并所有清单的域名为一个集合，供 check_with_rules 快速排除未命中的 URL。"""
+    domains: Set[str] = set()
+    urls: Set[str] = set()
+    for name, entry in rs.items():
+        for kind in ("block", "allow"):
+            domains.update(entry.get(kind, ()))
+        urls.update(entry.get("urls", ()))
+    rs["_index"] = {"domains": domains, "urls": urls}
+
+def _host_suffixes(host: str) -> List[str]:
+    """a.b.example.com -> [a.b.example.com, b.example.com, example.com, com]"""
+    labels = host.split(".")
+    return [".".join(labels[i:]) for i in range(len(labels))]
+
+def check_with_rules(url: str, rulesets: Dict[str, dict], host: Optional[str] = None) -> Tuple[Dict[str, bool], Dict[str, str]]:
+    """对单个 URL 进行规则匹配；返回 (命中字典, 命中依据)。host 已解析时可直接传入。"""
+    if host is None:
+        host = extract_host(url)
     hits = {}
     reasons = {}
 
+    # host 自身及其各级后缀（a.b.c -> a.b.c, b.c, c）：d 在其中 等价于 host == d 或 host 以 "." + d 结尾，
+    # 每个清单只需按 host 的标签数做几次集合查找，与清单大小无关
+    suffixes = _host_suffixes(host)
+
+    # 合并索引预筛：绝大多数 URL 不在任何清单中，一次集合探测即可返回
+    index = rulesets.get("_index")
+    if index is not None and url not in index["urls"] and index["domains"].isdisjoint(suffixes):
+        return hits, reasons
+
     # metamask
     mm = rulesets.get("metamask")
     if mm:
         bl = mm.get("block", set())
         al = mm.get("allow", set())
-        # 后缀匹配
-        if any(host == d or host.endswith("." + d) for d in bl):
+        # 后缀匹配（子域也命中）
+        if not bl.isdisjoint(suffixes):
             hits["metamask"] = True
             reasons["metamask"] = "blocklist"
-        elif any(host == d or host.endswith("." + d) for d in al):
+        elif not al.isdisjoint(suffixes):
             hits["metamask"] = False
             reasons["metamask"] = "allowlist"
 
@@ -95,7 +170,7 @@ def check_with_rules(url: str, rulesets: Dict[str, dict]) -> Tuple[Dict[str, boo
     pd = rulesets.get("polkadot_all")
     if pd:
         bl = pd.get("block", set())
-        if any(host == d or host.endswith("." + d) for d in bl):
+        if not bl.isdisjoint(suffixes):
             hits["polkadot"] = True
             reasons["polkadot"] = "all.json"
 
@@ -103,7 +178,7 @@ def check_with_rules(url: str, rulesets: Dict[str, dict]) -> Tuple[Dict[str, boo
     pdbd = rulesets.get("phishing_db_domains")
     if pdbd:
         bl = pdbd.get("block", set())
-        if any(host == d or host.endswith("." + d) for d in bl):
+        if not bl.isdisjoint(suffixes):
             hits["phishing_database_domains"] = True
             reasons["phishing_database_domains"] = "phishing-domains-ACTIVE.txt"
 
@@ -119,8 +194,23 @@ def check_with_rules(url: str, rulesets: Dict[str, dict]) -> Tuple[Dict[str, boo
     cs = rulesets.get("cryptoscamdb")
     if cs:
         bl = cs.get("block", set())
-        if any(host == d or host.endswith("." + d) for d in bl):
+        if not bl.isdisjoint(suffixes):
             hits["cryptoscamdb"] = True
             reasons["cryptoscamdb"] = "API blacklist"
 
     return hits, reasons
+
+def check_many_with_rules(urls: List[str], rulesets: Optional[Dict[str, dict]] = None, selected: Optional[frozenset] = None, hosts: Optional[List[str]] = None) -> List[Tuple[Dict[str, bool], Dict[str, str]]]:
+    """批量规则匹配；rulesets 为空时使用缓存的规则集，selected 不为空时只保留所选规则源的命中。"""
+    if rulesets is None:
+        rulesets = get_rulesets()
+    if hosts is None:
+        hosts = [extract_host(u) for u in urls]
+    out = []
+    for url, host in zip(urls, hosts):
+        hits, reasons = check_with_rules(url, rulesets, host)
+        if selected is not None:
+            hits = {k: v for k, v in hits.items() if k in selected}
+            reasons = {k: v for k, v in reasons.items() if k in selected}
+        out.append((hits, reasons))
+    return out
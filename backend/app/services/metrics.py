@@ -1,11 +1,17 @@
 from __future__ import annotations
 from typing import List, Dict
+import numpy as np
 
 def compute_metrics(y_true: List[int], y_pred: List[int]) -> Dict[str, float]:
-    tp = sum(1 for yt, yp in zip(y_true, y_pred) if yt==1 and yp==1)
-    tn = sum(1 for yt, yp in zip(y_true, y_pred) if yt==0 and yp==0)
-    fp = sum(1 for yt, yp in zip(y_true, y_pred) if yt==0 and yp==1)
-    fn = sum(1 for yt, yp in zip(y_true, y_pred) if yt==1 and yp==0)
+    # 转成数组后用向量化的布尔运算统计混淆矩阵
+    yt = np.asarray(y_true, dtype=np.int64)
+    yp = np.asarray(y_pred, dtype=np.int64)
+    t1, t0 = yt == 1, yt == 0
+    p1, p0 = yp == 1, yp == 0
+    tp = int(np.count_nonzero(t1 & p1))
+    tn = int(np.count_nonzero(t0 & p0))
+    fp = int(np.count_nonzero(t0 & p1))
+    fn = int(np.count_nonzero(t1 & p0))
     total = max(1, len(y_true))
     acc = (tp+tn)/total
     prec = tp/max(1,tp+fp)
@@ -1,44 +1,117 @@
 from __future__ import annotations
-from typing import Dict
+import asyncio
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
 from pathlib import Path
 from ..config import MODELS_DIR
 
 from .detectors.baseline_sklearn import HeuristicBaseline
 
+def _load_urltran():
+    # torch / transformers 只在首次使用 URLTran 时才导入
+    from .detectors.urltran_wrapper import URLTranWrapper
+    return URLTranWrapper()
+
 class ModelRegistry:
     def __init__(self):
         self.models: Dict[str, object] = {}
+        # 只登记构造函数，模型在第一次被请求时才实例化
+        self._factories: Dict[str, Callable[[], object]] = {}
+        self._failed: Dict[str, str] = {}
+        self._lock = threading.Lock()
         self._load_builtin()
 
     def _load_builtin(self):
-        self.models["heuristic_baseline"] = HeuristicBaseline()
+        self._factories["heuristic_baseline"] = HeuristicBaseline
+        self._factories["urltran"] = _load_urltran
 
-        # 延迟加载URLTran模型
-        try:
-            from .detectors.urltran_wrapper import URLTranWrapper
-            self.models["urltran"] = URLTranWrapper()
-            print("✅ URLTran model loaded successfully")
-        except Exception as e:
-            print(f"❌ Failed to load URLTran: {e}")
-            # 如果URLTran加载失败，不将其添加到模型列表中
+    def get_model(self, key: str) -> Optional[object]:
+        """返回已实例化的模型；首次访问时构造，加载失败则记录并返回 None。"""
+        m = self.models.get(key)
+        if m is not None or key not in self._factories:
+            return m
+        with self._lock:
+            if key in self.models:
+                return self.models[key]
+            if key in self._failed:
+                return None
+            try:
+                m = self._factories[key]()
+            except Exception as e:
+                print(f"❌ Failed to load {key}: {e}")
+                # 加载失败的模型不再重试，按未注册处理
+                self._failed[key] = str(e)
+                return None
+            self.models[key] = m
+            print(f"✅ {key} model loaded successfully")
+            return m
 
     def list_models(self) -> Dict[str, dict]:
         entries = {}
-        for k, v in self.models.items():
+        for k in self._factories:
+            if k in self._failed:
+                continue
+            v = self.models.get(k)
             entries[k] = {"name": getattr(v, "name", k), "installed": True, "type": "builtin"}
+            # 已加载且带预测缓存的模型附上缓存命中统计
+            if hasattr(v, "cache_info"):
+                entries[k]["cache"] = v.cache_info()
         # 检查已下载但未集成的仓库（显示为可用但未启用）
         for sub in MODELS_DIR.iterdir():
-            if sub.is_dir() and sub.name not in entries:
+            # 跳过 .cache 等隐藏目录（本地生成的导出/权重缓存，不是模型仓库）
+            if sub.is_dir() and not sub.name.startswith(".") and sub.name not in entries:
                 entries[sub.name] = {"name": sub.name, "installed": True, "type": "git", "note": "仓库已在 data/models/ 下，但未在后端注册推断包装器"}
         return entries
 
     def predict_all(self, url: str, use: list[str], threshold=0.5) -> Dict[str, dict]:
         out = {}
         for key in use:
-            if key in self.models:
-                m = self.models[key]
+            m = self.get_model(key)
+            if m is not None:
                 proba = m.predict_proba(url)
                 out[key] = {"proba": proba, "label": int(proba >= threshold)}
             else:
                 out[key] = {"proba": None, "label": None, "error": "model not registered"}
         return out
+
+    def _predict_model_batch(self, key: str, urls: List[str], threshold=0.5, hosts: Optional[List[str]] = None) -> List[dict]:
+        """单个模型对整批 URL 推断；模型提供 predict_proba_batch 时一次调用处理整批。"""
+        m = self.get_model(key)
+        if m is None:
+            return [{"proba": None, "label": None, "error": "model not registered"} for _ in urls]
+        batch_fn = getattr(m, "predict_proba_batch", None)
+        if batch_fn and hosts is not None and getattr(m, "uses_host", False):
+            # 模型声明 uses_host 时复用调用方已解析的 host
+            probas = batch_fn(urls, hosts)
+        else:
+            probas = batch_fn(urls) if batch_fn else [m.predict_proba(u) for u in urls]
+        out = []
+        for proba in probas:
+            proba = float(proba)
+            out.append({"proba": proba, "label": int(proba >= threshold)})
+        return out
+
+    @staticmethod
+    def _merge_columns(n: int, use: list[str], columns: Dict[str, List[dict]]) -> List[Dict[str, dict]]:
+        out: List[Dict[str, dict]] = [{} for _ in range(n)]
+        for key in use:
+            for row, pred in zip(out, columns[key]):
+                row[key] = pred
+        return out
+
+    async def predict_all_batch_async(self, urls: List[str], use: list[str], threshold=0.5, max_concurrency=4, hosts: Optional[List[str]] = None) -> List[Dict[str, dict]]:
+        """对整批 URL 逐模型推断，返回与 urls 对齐的 predict_all 结果列表；各模型在线程池中并发推断，不阻塞事件循环。"""
+        sem = asyncio.Semaphore(max_concurrency)
+
+        async def run(key: str):
+            async with sem:
+                return key, await asyncio.to_thread(self._predict_model_batch, key, urls, threshold, hosts)
+
+        columns = dict(await asyncio.gather(*(run(key) for key in dict.fromkeys(use))))
+        return self._merge_columns(len(urls), use, columns)
+
+@lru_cache(maxsize=1)
+def get_registry() -> ModelRegistry:
+    """进程内共享的模型注册表（scan / evaluate / sources 共用一个实例）。"""
+    return ModelRegistry()
@@ -1,18 +1,47 @@
-import re, idna
+import re, idna, string
 import tldextract
 from urllib.parse import urlparse
 
+try:
+    # 可选依赖：安装 pyahocorasick 后可疑词一次线性扫描完成
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 SUS_WORDS = [
     "login","verify","secure","account","update","confirm","wallet","airdrop",
     "bonus","free","gift","support","resolution","invoice","okta","microsoft",
     "apple","google","bank","security","unlock","password","reset"
 ]
 
+def _build_sus_automaton():
+    if ahocorasick is None:
+        return None
+    a = ahocorasick.Automaton()
+    for w in SUS_WORDS:
+        a.add_word(w, w)
+    a.make_automaton()
+    return a
+
+_SUS_AC = _build_sus_automaton()
+
+def count_susp_words(ul: str) -> int:
+    """统计小写 URL 中出现的可疑词种数（同一个词出现多次只算一次）"""
+    if _SUS_AC is not None:
+        return len({w for _, w in _SUS_AC.iter(ul)})
+    return sum(1 for w in SUS_WORDS if w in ul)
+
+_SCHEME_RE = re.compile(r'^[a-zA-Z]+://')
+# ASCII 字符分类用的删除表：len(u) - len(u.translate(表)) 即该类字符个数，整串在 C 层一次扫描
+_DEL_DIGITS = str.maketrans("", "", string.digits)
+_DEL_LETTERS = str.maketrans("", "", string.ascii_letters)
+_DEL_ALNUM = str.maketrans("", "", string.ascii_letters + string.digits)
+
 def normalize_url(u: str) -> str:
     u = u.strip()
     if not u:
         return u
-    if not re.match(r'^[a-zA-Z]+://', u):
+    if not _SCHEME_RE.match(u):
         u = "http://" + u
     return u
 
@@ -39,13 +68,22 @@ def suffix_match(host: str, patterns: list[str]) -> bool:
             return True
     return False
 
-def url_char_features(url: str) -> dict:
+def url_char_features(url: str, host: str | None = None) -> dict:
+    # host 可由调用方预先算好传入，避免同一 URL 重复解析
     u = normalize_url(url)
-    host = extract_host(u)
-    digits = sum(c.isdigit() for c in u)
-    letters = sum(c.isalpha() for c in u)
-    specials = sum(not c.isalnum() for c in u)
-    susp = sum(1 for w in SUS_WORDS if w in u.lower())
+    if host is None:
+        host = extract_host(u)
+    n = len(u)
+    if u.isascii():
+        digits = n - len(u.translate(_DEL_DIGITS))
+        letters = n - len(u.translate(_DEL_LETTERS))
+        specials = len(u.translate(_DEL_ALNUM))
+    else:
+        # 非 ASCII 需按 Unicode 语义分类
+        digits = sum(c.isdigit() for c in u)
+        letters = sum(c.isalpha() for c in u)
+        specials = sum(not c.isalnum() for c in u)
+    susp = count_susp_words(u.lower())
     return {
         "len": len(u),
         "host_len": len(host),
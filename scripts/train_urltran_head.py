@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+在带标签的 URL 数据集上训练 URLTran 的分类头，写入 backend/app/data/models/.cache/urltran/classifier_head.pt。
+BERT 主干冻结不动，只训练最后的线性分类层；后端加载 URLTran 时自动使用该文件。
+"""
+import os, sys, csv, argparse, tempfile
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE/"backend"))
+from app.services.dataset import SAMPLE_PATH
+
+def load_csv(path: Path):
+    urls, labels = [], []
+    with path.open("r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            urls.append(row["url"])
+            labels.append(int(row["label"]))
+    return urls, labels
+
+def main():
+    parser = argparse.ArgumentParser(description="训练 URLTran 分类头")
+    parser.add_argument("--csv", type=Path, default=SAMPLE_PATH, help="带 url,label 两列的 CSV（默认样例数据集，样本很少，只适合演示）")
+    parser.add_argument("--epochs", type=int, default=200, help="训练轮数")
+    parser.add_argument("--lr", type=float, default=1e-3, help="学习率")
+    parser.add_argument("--batch-size", type=int, default=64, help="提取特征时的批大小")
+    args = parser.parse_args()
+
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    from app.services.detectors.urltran_wrapper import CLASSIFIER_HEAD_PATH, _clean_url
+
+    urls, labels = load_csv(args.csv)
+    if len(set(labels)) < 2:
+        print(f"[ERR] {args.csv} 需同时包含 0 和 1 两类标签")
+        sys.exit(1)
+    print(f"[*] 训练样本 {len(urls)} 条（正例 {sum(labels)}）: {args.csv}")
+
+    torch.manual_seed(0)
+    tokenizer = AutoTokenizer.from_pretrained("bert-base-uncased", use_fast=True)
+    model = AutoModelForSequenceClassification.from_pretrained("bert-base-uncased", num_labels=2, problem_type="single_label_classification")
+    model.eval()
+
+    # 主干冻结，pooled 输出只需算一次
+    feats = []
+    with torch.inference_mode():
+        for i in range(0, len(urls), args.batch_size):
+            cleaned = [_clean_url(u) for u in urls[i:i + args.batch_size]]
+            inputs = tokenizer(cleaned, return_tensors="pt", max_length=128, truncation=True, padding="longest")
+            feats.append(model.bert(**inputs).pooler_output)
+    x = torch.cat(feats)
+    y = torch.tensor(labels, dtype=torch.long)
+
+    head = model.classifier
+    opt = torch.optim.Adam(head.parameters(), lr=args.lr)
+    for epoch in range(args.epochs):
+        opt.zero_grad()
+        loss = torch.nn.functional.cross_entropy(head(x), y)
+        loss.backward()
+        opt.step()
+    acc = (head(x).argmax(dim=1) == y).float().mean().item()
+    print(f"[*] loss={loss.item():.4f} train_acc={acc:.3f}")
+
+    # 先写临时文件再原子替换，运行中的服务不会读到写了一半的权重
+    CLASSIFIER_HEAD_PATH.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=CLASSIFIER_HEAD_PATH.parent, suffix=".pt")
+    os.close(fd)
+    torch.save(head.state_dict(), tmp)
+    os.replace(tmp, CLASSIFIER_HEAD_PATH)
+    print(f"[✓] 分类头已写入 {CLASSIFIER_HEAD_PATH}")
+
+if __name__ == "__main__":
+    main()